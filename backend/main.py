@@ -2,12 +2,16 @@ from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
 from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import os
 import shutil
 import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from services.video_processor import VideoProcessor
 from services.ai_verifier import AIVerifier
+from services.scene_cache import SceneCache
 
 app = FastAPI()
 
@@ -17,6 +21,9 @@ UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
+# How many detect/split/group jobs may run at the same time
+MAX_CONCURRENT_JOBS = int(os.environ.get("VIDEOTOOLS_MAX_JOBS", "2"))
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,13 +34,65 @@ app.add_middleware(
 )
 
 video_processor = VideoProcessor()
+scene_cache = SceneCache()
 # Lazy load AI verifier to avoid startup lag or if unused
 ai_verifier = None # AIVerifier() 
 
+class ProgressChannel:
+    """
+    Carries events from a worker thread to an async generator.
+    Progress is coalesced: if the client is slower than the worker, only the
+    latest progress item waits in the queue and older ones are dropped.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._progress = asyncio.Queue(maxsize=1)
+        self._done = asyncio.Queue()
+
+    def publish(self, item: Dict[str, Any]):
+        # Called from the worker thread
+        self._loop.call_soon_threadsafe(self._replace_progress, item)
+
+    def close(self):
+        # Called from the worker thread once it has finished
+        self._loop.call_soon_threadsafe(self._done.put_nowait, None)
+
+    def _replace_progress(self, item: Dict[str, Any]):
+        try:
+            self._progress.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self._progress.put_nowait(item)
+
+    async def events(self):
+        done = asyncio.ensure_future(self._done.get())
+        progress = None
+        try:
+            while True:
+                progress = asyncio.ensure_future(self._progress.get())
+                await asyncio.wait({progress, done}, return_when=asyncio.FIRST_COMPLETED)
+                if progress.done():
+                    yield progress.result()
+                else:
+                    progress.cancel()
+                if done.done():
+                    # The last progress may have been published right before close()
+                    if not self._progress.empty():
+                        yield self._progress.get_nowait()
+                    return
+        finally:
+            # Also on client disconnect, while both are still pending in asyncio.wait
+            done.cancel()
+            if progress is not None:
+                progress.cancel()
+
 class VideoRequest(BaseModel):
     path: str
     threshold: float = 27.0
     use_ai: bool = False
+    frame_skip: int = 0 # 0 = every frame; 1-2 for a faster, coarser preview
+    fast: bool = False # Approximate cuts from ffmpeg's scene filter instead of scenedetect
+    luma_only: bool = False # Grayscale-only content detection; cheaper, may need a lower threshold
 
 class Scene(BaseModel):
     start: float
@@ -47,6 +106,7 @@ class AnalysisResponse(BaseModel):
 class SplitRequest(BaseModel):
     video_path: str
     scenes: List[Scene]
+    mode: Literal["fast", "precise"] = "precise" # "fast": stream copy, re-encoding only scenes that don't start on a keyframe
 
 class GroupRequest(BaseModel):
     video_path: str
@@ -59,19 +119,45 @@ async def root():
 from services.video_grouper import VideoGrouper
 video_grouper = VideoGrouper()
 
+@app.on_event("startup")
+async def init_worker_pool():
+    # Long-running jobs (detection, splitting, grouping) share one bounded pool,
+    # and a semaphore queues requests beyond MAX_CONCURRENT_JOBS instead of
+    # letting every client start its own decode/encode.
+    app.state.job_pool = ThreadPoolExecutor(max_workers=max(MAX_CONCURRENT_JOBS, (os.cpu_count() or 2) // 2))
+    app.state.job_limiter = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+@app.on_event("shutdown")
+async def shutdown_worker_pool():
+    app.state.job_pool.shutdown(wait=False, cancel_futures=True)
+    # Release the videos held open for thumbnails
+    video_processor.close()
+
+@app.on_event("startup")
+async def preload_ai_model():
+    # Opt-in: loading the vision model takes seconds and a lot of (V)RAM
+    if os.environ.get("VIDEOTOOLS_PRELOAD_MODEL") == "1":
+        asyncio.get_running_loop().run_in_executor(None, video_grouper.preload_model)
+
 @app.post("/api/regroup")
 async def regroup_scenes(request: GroupRequest):
     # Pass video_path as well now
-    grouped_scenes = video_grouper.group_scenes(request.video_path, request.scenes)
+    # group_scenes awaits ollama and runs its thumbnail/grid work in threads
+    async with app.state.job_limiter:
+        grouped_scenes = await video_grouper.group_scenes(request.video_path, request.scenes)
     return {"scenes": grouped_scenes}
 
 @app.post("/api/analyze")
-async def analyze_video(request: VideoRequest):
+async def analyze_video(request: VideoRequest, cache: bool = True):
     if not os.path.exists(request.path):
         raise HTTPException(status_code=404, detail="File not found")
     
     print(f"Analyzing {request.path} with threshold {request.threshold}")
     
+    # Results are keyed on the file's identity (path, mtime, size) and the detection settings
+    cache_key = scene_cache.make_key(request.path, request.threshold, request.frame_skip, request.fast, request.luma_only)
+    cached = scene_cache.get(cache_key) if cache else None
+    
     async def event_generator():
         try:
             # We need to run the blocking call in a way that allows yielding.
@@ -89,44 +175,53 @@ async def analyze_video(request: VideoRequest):
             # Just yield "progress" events from the loop IF we can control the loop.
             # But scenedetect controls the loop.
             
-            # Hybrid approach: Use a queue.
-            import queue
-            q = queue.Queue()
-            
-            def progress_callback(percent, fps=0.0, eta=0.0, scenes=0):
-                q.put({"type": "progress", "value": percent, "fps": fps, "eta": eta, "scenes": scenes})
-            
-            # Run detection in a separate thread
-            import threading
             result_container = {}
             
-            def run_detection():
-                try:
-                    scenes = video_processor.detect_scenes(request.path, request.threshold, callback=progress_callback)
-                    result_container['data'] = scenes
-                except Exception as ex:
-                    result_container['error'] = str(ex)
-                finally:
-                    q.put(None) # Signal done
+            if cached is not None:
+                # Same file, same settings: skip decoding entirely
+                print(f"DEBUG: Cache hit with {len(cached)} scenes")
+                result_container['data'] = cached
+                yield json.dumps({"type": "progress", "value": 100, "fps": 0.0, "eta": 0.0, "scenes": len(cached)}) + "\n"
+            else:
+                # Hybrid approach: Use a queue.
+                # The worker thread hands items to the event loop (see ProgressChannel),
+                # so the generator can simply await them instead of polling.
+                loop = asyncio.get_running_loop()
+                channel = ProgressChannel(loop)
             
-            t = threading.Thread(target=run_detection)
-            t.start()
+                def progress_callback(percent, fps=0.0, eta=0.0, scenes=0):
+                    channel.publish({"type": "progress", "value": percent, "fps": fps, "eta": eta, "scenes": scenes})
             
-            while True:
-                # Non-blocking check or small timeout
-                try:
-                    item = q.get(timeout=0.1)
-                    if item is None:
-                        break
-                    yield json.dumps(item) + "\n"
-                except queue.Empty:
-                    if not t.is_alive():
-                        print("DEBUG: Thread died, breaking loop")
-                        break
-                    continue
+                # Set when the client goes away, so the detection stops instead of running on
+                stop = threading.Event()
+
+                # Run detection in the default executor
+                def run_detection():
+                    try:
+                        if request.fast:
+                            scenes = video_processor.detect_scenes_fast(request.path, request.threshold, callback=progress_callback, stop_event=stop)
+                        else:
+                            scenes = video_processor.detect_scenes(request.path, request.threshold, callback=progress_callback, frame_skip=request.frame_skip, luma_only=request.luma_only, stop_event=stop)
+                        result_container['data'] = scenes
+                        scene_cache.put(cache_key, scenes)
+                    except Exception as ex:
+                        result_container['error'] = str(ex)
+                    finally:
+                        channel.close() # Signal done
             
-            t.join()
-            print("DEBUG: Thread joined.")
+                # Only MAX_CONCURRENT_JOBS detections/splits run at once; the rest wait here
+                async with app.state.job_limiter:
+                    detection = loop.run_in_executor(app.state.job_pool, run_detection)
+                    try:
+                        async for item in channel.events():
+                            yield json.dumps(item) + "\n"
+
+                        await detection
+                    finally:
+                        # Client disconnected: stop the decode (or ffmpeg) instead of leaving
+                        # it running on job_pool outside job_limiter
+                        stop.set()
+                print("DEBUG: Detection finished.")
             
             if 'error' in result_container:
                 print(f"DEBUG: Error in result: {result_container['error']}")
@@ -165,44 +260,42 @@ async def split_video(request: SplitRequest):
     async def event_generator():
         try:
             # Same pattern for splitting
-            import queue
-            import threading
-            q = queue.Queue()
+            loop = asyncio.get_running_loop()
+            channel = ProgressChannel(loop)
             
             def progress_callback(percent):
-                q.put({"type": "progress", "value": percent})
+                channel.publish({"type": "progress", "value": percent})
                 
             result_container = {}
             
-            def run_split():
+            async def run_split():
                 try:
-                    files = video_processor.split_video(
+                    # ffmpeg encodes run as asyncio subprocesses, several at a time
+                    files = await video_processor.split_video_async(
                         request.video_path, 
                         [(s.start, s.end) for s in request.scenes],
                         output_dir,
-                        callback=progress_callback
+                        callback=progress_callback,
+                        fast=request.mode == "fast"
                     )
                     result_container['data'] = files
                 except Exception as ex:
                     result_container['error'] = str(ex)
                 finally:
-                    q.put(None)
+                    channel.close()
             
-            t = threading.Thread(target=run_split)
-            t.start()
-            
-            while True:
+            async with app.state.job_limiter:
+                split = asyncio.ensure_future(run_split())
                 try:
-                    item = q.get(timeout=0.1)
-                    if item is None:
-                        break
-                    yield json.dumps(item) + "\n"
-                except queue.Empty:
-                    if not t.is_alive():
-                        break
-                    continue
-                    
-            t.join()
+                    async for item in channel.events():
+                        yield json.dumps(item) + "\n"
+
+                    await split
+                finally:
+                    # Client went away: cancel the split (killing its ffmpeg processes)
+                    # instead of leaving it running outside job_limiter
+                    if not split.done():
+                        split.cancel()
             
             if 'error' in result_container:
                 yield json.dumps({"type": "error", "message": result_container['error']}) + "\n"
@@ -234,7 +327,7 @@ async def stream_video(path: str, start: float = 0.0, end: float = 0.0):
     
     def transcode():
         # Build command with optional seeking
-        cmd = ['ffmpeg']
+        cmd = [video_processor.ffmpeg_path]
         
         # Seeking input (faster)
         if start > 0:
@@ -282,7 +375,7 @@ async def get_thumbnail(path: str, time: float):
     
     try:
         from fastapi.responses import Response
-        image_bytes = video_processor.generate_thumbnail(path, time)
+        image_bytes = await video_processor.generate_thumbnail_async(path, time)
         return Response(content=image_bytes, media_type="image/jpeg")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
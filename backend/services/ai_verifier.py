@@ -1,36 +1,82 @@
 import ollama
 import os
+import sqlite3
+import threading
+import imagehash
+from PIL import Image
+
+# One client (and HTTP connection pool) for the whole process
+_client = ollama.Client()
+
+# Keep the model resident between calls instead of letting ollama unload it
+KEEP_ALIVE = '30m'
 
 class AIVerifier:
-    def __init__(self, model: str = "llama3.2-vision"):
+    def __init__(self, model: str = "llama3.2-vision", cache_path: str = "verify_cache.db"):
         self.model = model
+        # Verdicts keyed by the perceptual hashes of both frames, so near-identical
+        # frames from a re-run skip the LLM round-trip.
+        self._cache_lock = threading.Lock()
+        self._cache = sqlite3.connect(cache_path, check_same_thread=False)
+        self._cache.execute("CREATE TABLE IF NOT EXISTS verify_cache (key TEXT PRIMARY KEY, is_change INT)")
+        self._cache.commit()
+
+    def _cache_key(self, image_path_a: str, image_path_b: str) -> str:
+        hashes = []
+        for path in (image_path_a, image_path_b):
+            with Image.open(path) as img:
+                hashes.append(str(imagehash.phash(img)))
+        # A scene change is symmetric, so the pair is order-independent.
+        # The model name is part of the key; a different model gets fresh verdicts.
+        return "|".join([self.model] + sorted(hashes))
 
     def verify_scene_change(self, image_path_a: str, image_path_b: str) -> bool:
         """
         Uses Ollama Vision model to check if two images represent a scene change.
         Returns True if it IS a scene change, False otherwise.
         """
+        try:
+            key = self._cache_key(image_path_a, image_path_b)
+            with self._cache_lock:
+                row = self._cache.execute("SELECT is_change FROM verify_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return bool(row[0])
+        except Exception as e:
+            print(f"Error reading AI verification cache: {e}")
+            key = None
+
         try:
             # We will send both images and ask for comparison.
             # Llama 3.2 Vision supports multiple images? 
             # If not, we might need to stitch them or describe them separately.
             # Assuming Llama 3.2 Vision supports multiple images in one message.
             
-            response = ollama.chat(model=self.model, messages=[
+            images = []
+            for path in (image_path_a, image_path_b):
+                with open(path, 'rb') as f:
+                    images.append(f.read())
+
+            response = _client.chat(model=self.model, messages=[
                 {
                     'role': 'user',
                     'content': 'Are these two images from the same continuous scene or is there a cut/scene change between them? Reply ONLY with "SAME SCENE" or "SCENE CHANGE".',
-                    'images': [image_path_a, image_path_b]
+                    'images': images
                 }
-            ])
+            ], keep_alive=KEEP_ALIVE, options={'num_ctx': 4096})
             
             answer = response['message']['content'].upper()
             
             print(f"AI Verification: {answer}")
             
-            if "SCENE CHANGE" in answer:
-                return True
-            return False
+            is_change = "SCENE CHANGE" in answer
+            if key is not None:
+                with self._cache_lock:
+                    self._cache.execute(
+                        "INSERT OR REPLACE INTO verify_cache (key, is_change) VALUES (?, ?)",
+                        (key, int(is_change))
+                    )
+                    self._cache.commit()
+            return is_change
             
         except Exception as e:
             print(f"Error in AI verification: {e}")
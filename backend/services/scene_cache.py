@@ -0,0 +1,41 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+class SceneCache:
+    """
+    Disk-backed cache of scene detection results, so re-analyzing an unchanged
+    file with the same settings doesn't decode the video again.
+    """
+    def __init__(self, db_path: str = "scene_cache.db"):
+        self.db_path = db_path
+        # Written from the detection worker thread, read from the event loop
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scenes (key TEXT PRIMARY KEY, scenes_json TEXT)")
+        self._conn.commit()
+
+    def make_key(self, video_path: str, threshold: float, frame_skip: int = 0, fast: bool = False, luma_only: bool = False) -> str:
+        """
+        Builds the cache key from the file's identity and the detection settings.
+        Editing or replacing the file changes mtime/size and so misses the cache.
+        """
+        stat = os.stat(video_path)
+        return json.dumps([os.path.abspath(video_path), stat.st_mtime_ns, stat.st_size, round(threshold, 3), frame_skip, fast, luma_only])
+
+    def get(self, key: str) -> Optional[List[Tuple[float, float]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT scenes_json FROM scenes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return [tuple(scene) for scene in json.loads(row[0])]
+
+    def put(self, key: str, scenes: List[Tuple[float, float]]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scenes (key, scenes_json) VALUES (?, ?)",
+                (key, json.dumps(scenes))
+            )
+            self._conn.commit()
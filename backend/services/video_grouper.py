@@ -3,165 +3,215 @@ import shutil
 import base64
 import ollama
 import math
+import json
 import io
-from PIL import Image, ImageDraw, ImageFont
+import asyncio
+import cv2
+import numpy as np
 from typing import List, Dict, Any, Tuple
 from .video_processor import VideoProcessor
 
+# One client (and HTTP connection pool) for the whole process
+_client = ollama.Client()
+_async_client = ollama.AsyncClient()
+
+# Keep the model resident between batches instead of letting ollama unload it
+KEEP_ALIVE = '30m'
+
+_JSON_DECODER = json.JSONDecoder()
+
+def _extract_groups(content: str):
+    """
+    Finds the first JSON list of lists (e.g. [[1, 2], [3]]) in a model response,
+    tolerating prose before or after it. Returns None if there is none.
+    """
+    i = content.find('[')
+    while i != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(content, i)
+            if isinstance(value, list) and all(isinstance(group, list) for group in value):
+                return value
+        except json.JSONDecodeError:
+            pass
+        i = content.find('[', i + 1)
+    return None
+
 class VideoGrouper:
-    def __init__(self):
+    # Scenes per grid sent to the model
+    BATCH_SIZE = 9
+    # Grids in flight at once; a single-GPU ollama server handles a couple of vision requests well
+    MAX_PARALLEL_BATCHES = 2
+
+    def __init__(self, model: str = "llama3.2-vision"):
+        self.model = model
         self.video_processor = VideoProcessor()
-        self.output_dir = "temp_thumbnails"
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+        # The prompt only depends on how many scenes are in the grid, so build each one once
+        self._prompts = {n: self._build_prompt(n) for n in range(1, self.BATCH_SIZE + 1)}
+
+    @staticmethod
+    def _build_prompt(num_scenes: int) -> str:
+        # Prompt adjusted for grid
+        return (
+            f"You are a professional film editor. The image provided contains {num_scenes} numbered scenes in a grid. "
+            "Group them into logical events or locations based on visual similarity and narrative context. "
+            "Return the result strictly as a valid JSON list of lists of indices (the numbers shown on the images). "
+            "Example: [[1, 2], [3], [4, 5, 6]]. "
+            f"Ensure every index from 1 to {num_scenes} is included exactly once."
+        )
 
-    def _create_image_grid(self, image_paths: List[str]) -> str:
+    def preload_model(self):
         """
-        Stitches images into a grid and returns the path to the stitched image.
+        Loads the vision model into ollama ahead of the first grouping request.
+        """
+        try:
+            _client.generate(model=self.model, prompt='', keep_alive=KEEP_ALIVE)
+            print(f"Preloaded {self.model}")
+        except Exception as e:
+            print(f"Could not preload {self.model}: {e}")
+
+    def _create_image_grid(self, images: List[bytes]) -> bytes:
+        """
+        Stitches JPEG images into a grid and returns the stitched JPEG bytes.
         Adds number labels to each image.
+        Tiles are block-copied into one preallocated array, which for nine small
+        thumbnails is much cheaper than spawning an ffmpeg process.
         """
-        images = [Image.open(p) for p in image_paths]
         if not images:
-            return ""
+            return b""
 
         n = len(images)
         cols = 3
         rows = math.ceil(n / cols)
-        
-        # Assume all thumbnails are roughly same size (from ffmpeg scale=200:-1)
-        w, h = images[0].size
-        
-        # Create canvas
-        grid_w = cols * w
-        grid_h = rows * h
-        canvas = Image.new('RGB', (grid_w, grid_h), color=(0,0,0))
-        
-        draw = ImageDraw.Draw(canvas)
-        
-        # Try to load a font, fallback to default
-        try:
-            # Linux/Mac path logic omitted, focusing on basic win/default
-            font = ImageFont.truetype("arial.ttf", 20) 
-        except:
-            font = ImageFont.load_default()
 
-        for idx, img in enumerate(images):
+        canvas = None
+        for idx, data in enumerate(images):
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            if canvas is None:
+                # Assume all thumbnails are roughly same size (from ffmpeg scale=200:-1)
+                h, w = img.shape[:2]
+                canvas = np.zeros((rows * h, cols * w, 3), dtype=np.uint8)
+
+            # Resize if slightly different (just in case)
+            if img.shape[:2] != (h, w):
+                img = cv2.resize(img, (w, h))
+
             # Calculate position
             c = idx % cols
             r = idx // cols
             x = c * w
             y = r * h
-            
-            # Resize if slightly different (just in case)
-            if img.size != (w, h):
-                img = img.resize((w, h))
-                
-            canvas.paste(img, (x, y))
-            
-            # Draw Label "1", "2", etc.
-            label = str(idx + 1)
-            
-            # Draw semi-transparent box for text
+            canvas[y:y + h, x:x + w] = img
+            del img # Release the decoded tile right away
+
+            # Draw Label "1", "2", etc. on a black box
             text_x = x + 5
             text_y = y + 5
-            # Simplified box drawing
-            draw.rectangle([text_x, text_y, text_x + 30, text_y + 30], fill=(0, 0, 0, 128))
-            draw.text((text_x + 10, text_y + 5), label, fill=(255, 255, 255), font=font)
+            canvas[text_y:text_y + 30, text_x:text_x + 30] = 0
+            cv2.putText(canvas, str(idx + 1), (text_x + 5, text_y + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+        if canvas is None:
+            return b""
 
-        out_path = os.path.join(self.output_dir, "grid_stitch.jpg")
-        canvas.save(out_path)
-        return out_path
+        # ~quality 75 is plenty; the grid is only for LLM perception
+        ok, jpeg = cv2.imencode('.jpg', canvas, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        if not ok:
+            return b""
+        return jpeg.tobytes()
 
-    def group_scenes(self, video_path: str, scenes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def group_scenes(self, video_path: str, scenes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Groups scenes using Llama 3.2 Vision.
         Strategy: Stitch batch of 9 images into ONE grid to avoid multi-image limitation.
+        Batches run concurrently, so thumbnails for one batch are extracted while
+        the model is still looking at another.
         """
         if not scenes:
             return []
             
         print(f"Starting AI grouping for {len(scenes)} scenes...")
         
-        BATCH_SIZE = 9
+        BATCH_SIZE = self.BATCH_SIZE
         processed_scenes = [s.copy() for s in scenes]
-        group_id_offset = 0
         num_batches = math.ceil(len(processed_scenes) / BATCH_SIZE)
-        
-        for i in range(num_batches):
-            batch_start = i * BATCH_SIZE
-            batch_end = min((i + 1) * BATCH_SIZE, len(processed_scenes))
-            batch_indices = range(batch_start, batch_end)
-            
-            print(f"Processing batch {i+1}/{num_batches} (Scenes {batch_start+1}-{batch_end})")
-            
-            thumbnails = []
-            
-            for idx in batch_indices:
-                scene = processed_scenes[idx]
-                mid_point = (scene['start'] + scene['end']) / 2
-                try:
-                    thumb_data = self.video_processor.generate_thumbnail(video_path, mid_point)
-                    fname = os.path.join(self.output_dir, f"scene_{idx}.jpg")
-                    with open(fname, 'wb') as f:
-                        f.write(thumb_data)
-                    thumbnails.append(fname)
-                except Exception as e:
-                    print(f"Error generating thumbnail for scene {idx}: {e}")
-                    pass
-
-            if not thumbnails:
-                continue
+        semaphore = asyncio.Semaphore(self.MAX_PARALLEL_BATCHES)
 
-            # Stitch into single image
-            stitched_image_path = self._create_image_grid(thumbnails)
-            if not stitched_image_path:
-                print("Failed to stitch image.")
-                continue
+        async def run_batch(i):
+            async with semaphore:
+                return await self._process_batch(video_path, processed_scenes, i, num_batches)
 
-            # 2. Query AI with SINGLE image
-            try:
-                # Prompt adjusted for grid
-                prompt = (
-                    f"You are a professional film editor. The image provided contains {len(thumbnails)} numbered scenes in a grid. "
-                    "Group them into logical events or locations based on visual similarity and narrative context. "
-                    "Return the result strictly as a valid JSON list of lists of indices (the numbers shown on the images). "
-                    "Example: [[1, 2], [3], [4, 5, 6]]. "
-                    "Ensure every index from 1 to " + str(len(thumbnails)) + " is included exactly once."
-                )
-
-                response = ollama.chat(model='llama3.2-vision', messages=[
-                    {
-                        'role': 'user',
-                        'content': prompt,
-                        'images': [stitched_image_path] # ONE image now
-                    }
-                ])
-                
-                content = response['message']['content']
-                print(f"AI Response: {content}")
+        results = await asyncio.gather(*(run_batch(i) for i in range(num_batches)))
+
+        # Number groups in batch order once everything is back, so ids don't depend
+        # on which request finished first
+        group_id_offset = 0
+        for i, groups in enumerate(results):
+            if groups is None:
+                continue
+            batch_start = i * BATCH_SIZE
+            for group in groups:
+                group_id_offset += 1
+                current_gid = group_id_offset
                 
-                import re
-                json_match = re.search(r'\[.*\]', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    import json
-                    groups = json.loads(json_str)
-                    
-                    for group in groups:
-                        group_id_offset += 1
-                        current_gid = group_id_offset
-                        
-                        for local_idx in group:
-                            if isinstance(local_idx, int):
-                                # Convert 1-based local index to 0-based global index
-                                global_idx = batch_start + (local_idx - 1)
-                                if global_idx < len(processed_scenes):
-                                    processed_scenes[global_idx]['group_id'] = current_gid
-                                    
-                else:
-                     print("Could not parse JSON from AI response.")
-                     
-            except Exception as e:
-                print(f"AI Grouping Error: {e}")
+                for local_idx in group:
+                    if isinstance(local_idx, int):
+                        # Convert 1-based local index to 0-based global index
+                        global_idx = batch_start + (local_idx - 1)
+                        if global_idx < len(processed_scenes):
+                            processed_scenes[global_idx]['group_id'] = current_gid
                 
         return processed_scenes
+
+    async def _process_batch(self, video_path: str, processed_scenes: List[Dict[str, Any]], i: int, num_batches: int):
+        """
+        Builds the grid for batch `i` and asks the model to group it.
+        Returns the parsed groups (1-based indices within the batch), or None on failure.
+        """
+        batch_start = i * self.BATCH_SIZE
+        batch_end = min((i + 1) * self.BATCH_SIZE, len(processed_scenes))
+        batch_indices = range(batch_start, batch_end)
+        
+        print(f"Processing batch {i+1}/{num_batches} (Scenes {batch_start+1}-{batch_end})")
+        
+        # One ffmpeg pass for the whole batch instead of a process per scene.
+        # Thumbnails stay in memory; the grid is built from the bytes directly.
+        mid_points = [(processed_scenes[idx]['start'] + processed_scenes[idx]['end']) / 2 for idx in batch_indices]
+        try:
+            thumbnails = await asyncio.to_thread(self.video_processor.generate_thumbnails_batch, video_path, mid_points)
+        except Exception as e:
+            print(f"Error generating thumbnails for batch {i+1}: {e}")
+            thumbnails = []
+
+        if not thumbnails:
+            return None
+
+        # Stitch into single image
+        grid_bytes = await asyncio.to_thread(self._create_image_grid, thumbnails)
+        if not grid_bytes:
+            print("Failed to stitch image.")
+            return None
+
+        # 2. Query AI with SINGLE image
+        try:
+            prompt = self._prompts[len(thumbnails)]
+
+            response = await _async_client.chat(model=self.model, messages=[
+                {
+                    'role': 'user',
+                    'content': prompt,
+                    'images': [grid_bytes] # ONE image now
+                }
+            ], keep_alive=KEEP_ALIVE, options={'num_ctx': 4096})
+            
+            content = response['message']['content']
+            print(f"AI Response: {content}")
+            
+            groups = _extract_groups(content)
+            if groups is None:
+                 print("Could not parse JSON from AI response.")
+            return groups
+                 
+        except Exception as e:
+            print(f"AI Grouping Error: {e}")
+            return None
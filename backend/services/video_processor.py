@@ -1,28 +1,374 @@
 import os
+import re
+import asyncio
+import csv
 import subprocess
 import shutil
+import threading
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple
 from scenedetect import detect, ContentDetector, SceneManager, open_video, split_video_ffmpeg
-from scenedetect.scene_manager import save_images, compute_downscale_factor
+from scenedetect.scene_manager import save_images
+from scenedetect.scene_detector import SceneDetector
+from scenedetect.scene_manager import compute_downscale_factor
+from scenedetect.video_stream import VideoOpenFailure
+
+try:
+    import av
+    from scenedetect.backends.pyav import VideoStreamAv
+except ImportError:
+    av = None # Optional: without PyAV, detection decodes through OpenCV only
+
+_PTS_TIME_RE = re.compile(r'pts_time:\s*([\d.]+)')
+
+def _detect_gpu_resize():
+    """
+    Picks the backend used to downscale frames before detection: 'cuda', 'opencl' or None (CPU).
+    Set VIDEOTOOLS_GPU=0 to force the CPU path.
+    """
+    if os.environ.get("VIDEOTOOLS_GPU") == "0":
+        return None
+    try:
+        if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            return 'cuda'
+    except (AttributeError, cv2.error):
+        pass # OpenCV built without CUDA
+    try:
+        if cv2.ocl.haveOpenCL():
+            cv2.ocl.setUseOpenCL(True)
+            return 'opencl'
+    except cv2.error:
+        pass
+    return None
+
+GPU_RESIZE = _detect_gpu_resize()
+
+# Tried in order; the first device that decodes the video is used by detect_scenes
+_HW_DEVICE_TYPES = ['cuda', 'videotoolbox', 'qsv', 'd3d11va', 'dxva2', 'vaapi']
+
+if av is not None:
+    class _HwVideoStream(VideoStreamAv):
+        """
+        scenedetect's PyAV video stream, decoding on a hardware device (PyAV HWAccel).
+        SceneManager drives it like any other VideoStream; PyAV copies each decoded
+        frame back to host memory for the BGR conversion.
+        """
+        def __init__(self, video_path: str, hwaccel):
+            # suppress_output: probing devices that aren't there would print FFmpeg's errors
+            # on every analysis
+            super().__init__(video_path, suppress_output=True)
+            self._hwaccel = hwaccel
+            # The base class opened a software decoder; swap it for the hardware one
+            self.reset()
+
+        def reset(self):
+            self._container.close()
+            self._frame = None
+            self._container = av.open(self.path, hwaccel=self._hwaccel)
+
+def _open_video_hw(video_path: str):
+    """
+    Opens the video for detection on a hardware decoder.
+    Returns None if PyAV or a device that can decode this video is unavailable.
+    Set VIDEOTOOLS_GPU=0 to force CPU decoding.
+    """
+    if av is None or os.environ.get("VIDEOTOOLS_GPU") == "0":
+        return None
+    from av.codec.hwaccel import HWAccel, hwdevices_available
+
+    available = hwdevices_available()
+    for device_type in _HW_DEVICE_TYPES:
+        if device_type not in available:
+            continue
+        try:
+            video = _HwVideoStream(video_path, HWAccel(device_type=device_type, allow_software_fallback=False))
+            # Missing devices or codec support only show up once the first packet is decoded
+            if video.read(decode=True) is not False:
+                video.reset()
+                return video
+        except (av.error.FFmpegError, RuntimeError, VideoOpenFailure):
+            continue
+    return None
+
+# Resolved once at import; every VideoProcessor and ffmpeg call reuses it
+_FFMPEG_PATH = shutil.which('ffmpeg')
+
+# Short clips rarely saturate x264's threads, so encode several scenes in parallel.
+# Half the cores leaves room for each encoder's own threads.
+_SPLIT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Open thumbnail workers kept between requests: per video, and for this many videos
+_THUMB_WORKERS_PER_VIDEO = 4
+_THUMB_VIDEOS = 2
+# Idle workers are closed after this long, so the app doesn't keep the file open
+# (on Windows that blocks deleting or renaming it) once nobody is viewing the video
+_THUMB_IDLE_SECONDS = 30.0
+
+class _ProgressReporter(SceneDetector):
+    """
+    No-op detector that SceneManager calls once per processed frame.
+    Lets us report progress while scenedetect drives the decode loop itself.
+    """
+    # At most ~10 progress updates per second, however fast frames are processed
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, callback, total_frames: int):
+        super().__init__()
+        self.callback = callback
+        self.total_frames = total_frames
+        self.num_cuts = 0
+        self._start_time = time.monotonic()
+        self._last_report = self._start_time
+
+    def on_cut(self, frame_img, frame_num):
+        # Passed as the detect_scenes callback, which fires once per detected cut
+        self.num_cuts += 1
+
+    def process_frame(self, frame_num, frame_img):
+        now = time.monotonic()
+        if self.total_frames > 0 and now - self._last_report >= self.MIN_INTERVAL:
+            self._last_report = now
+            elapsed = now - self._start_time
+            # frame_num counts skipped frames too, so this is video frames covered per second
+            fps = frame_num / elapsed if elapsed > 0 else 0
+            
+            remaining_frames = self.total_frames - frame_num
+            eta = remaining_frames / fps if fps > 0 else 0
+            
+            progress = min(100, int((frame_num / self.total_frames) * 100))
+            
+            # # of scenes = # of cuts + 1 (or 0 while nothing has been found)
+            num_scenes_so_far = self.num_cuts + 1 if self.num_cuts > 0 else 0
+            self.callback(progress, fps, eta, num_scenes_so_far)
+        return []
+
+
+class _StopCheck(SceneDetector):
+    """
+    No-op detector that ends SceneManager's decode loop once `stop_event` is set.
+    """
+    def __init__(self, scene_manager: SceneManager, stop_event: threading.Event):
+        super().__init__()
+        self._scene_manager = scene_manager
+        self._stop_event = stop_event
+
+    def process_frame(self, frame_num, frame_img):
+        if self._stop_event.is_set():
+            self._scene_manager.stop()
+        return []
+
+
+class FrameSkipBuffer(SceneDetector):
+    """
+    No-op detector that only enlarges SceneManager's frame buffer.
+    With frame_skip, SceneManager looks up the frame for the per-cut callback by frame
+    number in a buffer of *processed* frames, and runs off its end (IndexError) when a
+    detector reports a cut a few frames late. The image passed to the callback is then
+    only approximately the cut frame.
+    """
+    def __init__(self, detector: SceneDetector, frame_skip: int):
+        super().__init__()
+        self._length = (detector.event_buffer_length + 1) * (frame_skip + 1)
+
+    @property
+    def event_buffer_length(self):
+        return self._length
+
+
+class LumaContentDetector(ContentDetector):
+    """
+    ContentDetector that scores frames on brightness alone.
+    Converts each frame straight to 8-bit grayscale instead of HSV and diffs that single
+    plane, so there is no hue/saturation work per frame. Scores run lower than the default
+    HSV average on colourful cuts, so it may need a lower threshold.
+    """
+    # Frames may be passed as cv2.UMat (see GpuDownscaler)
+    ACCEPTS_UMAT = True
+    def __init__(self, threshold: float = 27.0, min_scene_len: int = 15, **kwargs):
+        kwargs['luma_only'] = True
+        super().__init__(threshold=threshold, min_scene_len=min_scene_len, **kwargs)
+        self._last_lum = None
+        # Two grayscale planes are reused in turn (current / previous) instead of
+        # allocating a new one for every frame
+        self._spare_lum = None
+
+    def _calculate_frame_score(self, frame_num, frame_img):
+        if isinstance(frame_img, cv2.UMat):
+            # OpenCL (T-API): conversion and diff stay on the device, only the mean comes back
+            lum = cv2.cvtColor(frame_img, cv2.COLOR_BGR2GRAY)
+        else:
+            if self._spare_lum is None or self._spare_lum.shape != frame_img.shape[:2]:
+                self._spare_lum = np.empty(frame_img.shape[:2], np.uint8)
+            lum = cv2.cvtColor(frame_img, cv2.COLOR_BGR2GRAY, dst=self._spare_lum)
+        if self._last_lum is None or type(self._last_lum) is not type(lum):
+            self._spare_lum = None
+            self._last_lum = lum
+            return 0.0
+
+        if isinstance(lum, cv2.UMat):
+            score = cv2.mean(cv2.absdiff(lum, self._last_lum))[0]
+        else:
+            # Sum of absolute differences in one OpenCV pass over the uint8 planes (SIMD, no
+            # temporary), instead of scenedetect's int32 casts + numpy subtract/abs/sum
+            score = cv2.norm(lum, self._last_lum, cv2.NORM_L1) / lum.size
+        if self.stats_manager is not None:
+            self.stats_manager.set_metrics(frame_num, {
+                self.FRAME_SCORE_KEY: score,
+                'delta_hue': 0.0, 'delta_sat': 0.0, 'delta_lum': score, 'delta_edges': 0.0
+            })
+        if not isinstance(lum, cv2.UMat):
+            # Swap: the previous plane is overwritten by the next frame
+            self._spare_lum = self._last_lum
+        self._last_lum = lum
+        return score
+
+
+class GpuDownscaler(SceneDetector):
+    """
+    Wraps a detector and downscales each frame on the GPU (CUDA or OpenCL) before
+    handing it over, replacing SceneManager's own CPU cv2.resize.
+    With OpenCL, detectors that accept UMat get the frame without a copy back to the host.
+    Falls back to the CPU resize if the GPU call fails.
+    """
+    def __init__(self, detector: SceneDetector, backend: str, downscale: int = None):
+        super().__init__()
+        self.detector = detector
+        self.backend = backend
+        self.downscale = downscale # None = same factor as SceneManager.auto_downscale
+        self._keep_umat = getattr(detector, 'ACCEPTS_UMAT', False) and cv2.ocl.useOpenCL()
+        self._size = None
+
+    def _resize(self, frame_img):
+        if self._size is None:
+            height, width = frame_img.shape[:2]
+            factor = self.downscale or compute_downscale_factor(max(width, height))
+            self._size = (max(1, round(width / factor)), max(1, round(height / factor)))
+        if self._size == (frame_img.shape[1], frame_img.shape[0]):
+            return frame_img
+
+        if self.backend is not None:
+            try:
+                if self.backend == 'cuda':
+                    gpu_frame = cv2.cuda_GpuMat()
+                    gpu_frame.upload(frame_img)
+                    return cv2.cuda.resize(gpu_frame, self._size).download()
+                small = cv2.resize(cv2.UMat(frame_img), self._size)
+                return small if self._keep_umat else small.get()
+            except cv2.error as e:
+                print(f"GPU resize failed, using CPU: {e}")
+                self.backend = None
+        return cv2.resize(frame_img, self._size)
+
+    def get_metrics(self):
+        return self.detector.get_metrics()
+
+    def is_processing_required(self, frame_num):
+        self.detector.stats_manager = self.stats_manager
+        return self.detector.is_processing_required(frame_num)
+
+    def process_frame(self, frame_num, frame_img):
+        # SceneManager assigns the stats manager to the wrapper only
+        self.detector.stats_manager = self.stats_manager
+        if frame_img is not None and not self.detector.is_processing_required(frame_num):
+            # Not decoded (the detector's metrics are stored): SceneManager hands over the
+            # previous frame again. Resizing it would make it look like a new frame.
+            frame_img = None
+        if frame_img is not None:
+            frame_img = self._resize(frame_img)
+        return self.detector.process_frame(frame_num, frame_img)
+
+    def post_process(self, frame_num):
+        return self.detector.post_process(frame_num)
+
+    @property
+    def event_buffer_length(self):
+        return self.detector.event_buffer_length
+
+
+class _ThumbnailWorker:
+    """
+    Keeps one video open in-process (PyAV) so repeated thumbnails of the same file
+    only pay for a seek + decode, not an ffmpeg spawn and container open each time.
+    """
+    def __init__(self, video_path: str, width: int = 200):
+        import av # Optional dependency, imported lazily
+        self.video_path = video_path
+        self.width = width
+        self._container = av.open(video_path)
+        self._stream = self._container.streams.video[0]
+        self._stream.thread_type = 'AUTO'
+        start = self._stream.start_time or 0
+        self._start_seconds = float(start * self._stream.time_base)
+        self.touch()
+
+    def touch(self):
+        # Used by VideoProcessor to close workers that sat idle
+        self.last_used = time.monotonic()
+
+    def grab(self, time: float) -> bytes:
+        """
+        Returns a JPEG of the first frame at or after `time` seconds, scaled to `width`.
+        """
+        target = time + self._start_seconds
+        self._container.seek(int(target / self._stream.time_base), stream=self._stream)
+
+        # Seek lands on the previous keyframe; decode forward to the requested time
+        # (same result as ffmpeg's accurate input seek).
+        frame = None
+        for frame in self._container.decode(self._stream):
+            if frame.time is None or frame.time >= target:
+                break
+        if frame is None:
+            raise RuntimeError("No frame decoded for thumbnail")
+
+        height = max(1, int(frame.height * self.width / frame.width + 0.5))
+        image = frame.to_ndarray(width=self.width, height=height, format='bgr24')
+        ok, jpeg = cv2.imencode('.jpg', image)
+        if not ok:
+            raise RuntimeError("Failed to encode thumbnail")
+        return jpeg.tobytes()
+
+    def close(self):
+        self._container.close()
+
 
 class VideoProcessor:
+    ffmpeg_path = _FFMPEG_PATH
+
     def __init__(self):
-        if not shutil.which('ffmpeg'):
+        if self.ffmpeg_path is None:
             raise RuntimeError("FFmpeg not found in PATH. Please install FFmpeg (e.g. 'winget install Gyan.FFmpeg') and restart the application.")
+        # Thumbnails are requested one scene at a time for the same video, so keep
+        # the opened files around: idle workers per video, most recently used last.
+        # Concurrent requests each take their own worker instead of waiting on one.
+        self._thumb_workers = {}
+        self._thumb_worker_available = True
+        self._thumb_lock = threading.Lock()
+        self._thumb_sweep = None # Timer closing idle workers, while any are open
 
-    def detect_scenes(self, video_path: str, threshold: float = 27.0, callback=None) -> List[Tuple[float, float]]:
+    def detect_scenes(self, video_path: str, threshold: float = 27.0, callback=None, frame_skip: int = 0, luma_only: bool = False, stop_event: threading.Event = None) -> List[Tuple[float, float]]:
         """
         Detects scenes in a video using content detection.
         Returns a list of (start_time, end_time) tuples in seconds.
+        `frame_skip` processes 1 in every frame_skip+1 frames (faster, less precise).
+        `luma_only` compares grayscale frames instead of HSV (cheaper, ignores pure colour changes).
+        Setting `stop_event` stops decoding and raises RuntimeError instead of returning partial scenes.
         """
-        video = open_video(video_path)
+        # Decode on a hardware device if one can handle the video, otherwise OpenCV
+        video = _open_video_hw(video_path) or open_video(video_path)
         scene_manager = SceneManager()
-        scene_manager.add_detector(ContentDetector(threshold=threshold))
-        scene_manager._base_timecode = video.base_timecode
-        scene_manager._start_pos = video.base_timecode
-        if scene_manager._start_pos is None:
-             from scenedetect import FrameTimecode
-             scene_manager._start_pos = FrameTimecode(0, video.frame_rate)
+        detector_cls = LumaContentDetector if luma_only else ContentDetector
+        detector = detector_cls(threshold=threshold)
+        if GPU_RESIZE is not None:
+            # Frames reach the detector at full size and are downscaled on the GPU
+            scene_manager.auto_downscale = False
+            scene_manager.add_detector(GpuDownscaler(detector, GPU_RESIZE))
+        else:
+            scene_manager.auto_downscale = True
+            scene_manager.add_detector(detector)
         
         # Get total frames for progress calculation
         # Note: video.duration is a FrameTimecode object which uses .get_frames()
@@ -32,86 +378,29 @@ class VideoProcessor:
         elif hasattr(video.duration, 'frame_count'):
             total_frames = video.duration.frame_count
 
-        # Calculate downscale factor (mimic detect_scenes behavior)
-        # SceneManager default auto_downscale=True
-        # We need to replicate this logic because _process_frame() expects the USER to handle it if calling manually
-        effective_frame_size = video.frame_size
-        downscale_factor = compute_downscale_factor(max(effective_frame_size))
-        
-        import time
-        start_time = time.time()
-        import cv2
+        reporter = None
+        if callback:
+            reporter = _ProgressReporter(callback, total_frames)
+            scene_manager.add_detector(reporter)
+            if frame_skip > 0:
+                scene_manager.add_detector(FrameSkipBuffer(detector, frame_skip))
+        if stop_event is not None:
+            scene_manager.add_detector(_StopCheck(scene_manager, stop_event))
 
-        frame_num = 0
-        
-        while True:
-            frame = video.read()
-            # Handle termination: None or explicit False (some adapters return False on EOF)
-            if frame is None:
-                break
-            if isinstance(frame, bool) and not frame:
-                break
-            
-            # Apply Downscaling (Standard Logic)
-            if downscale_factor > 1.0:
-                frame_im = cv2.resize(
-                    frame,
-                    (
-                        max(1, round(frame.shape[1] / downscale_factor)),
-                        max(1, round(frame.shape[0] / downscale_factor)),
-                    ),
-                    interpolation=cv2.INTER_LINEAR,
-                )
-            else:
-                frame_im = frame
-            
-            # Use internal _process_frame since public API seems to lack simple frame feed in this version
-            # or it's hidden. This affords us granular progress control.
-            scene_manager._process_frame(frame_num, frame_im)
-            
-            frame_num += 1
-            
-            if callback and total_frames > 0 and frame_num % 30 == 0: # Update every ~30 frames
-                current_time = time.time()
-                elapsed = current_time - start_time
-                fps = frame_num / elapsed if elapsed > 0 else 0
-                
-                remaining_frames = total_frames - frame_num
-                eta = remaining_frames / fps if fps > 0 else 0
-                
-                progress = min(100, int((frame_num / total_frames) * 100))
-                
-                # Get number of cuts found so far
-                # _cutting_list contains timecodes of cuts. # of scenes = # of cuts + 1 (usually, or 0 if empty)
-                # Actually, detect_scenes source uses len(_cutting_list) to update progress bar. 
-                # Ideally we want "Scenes Found". 
-                num_cuts = len(scene_manager._cutting_list)
-                num_scenes_so_far = num_cuts + 1 if num_cuts > 0 or frame_num > 60 else 0 # Rough estimate
-                if num_cuts == 0:
-                     num_scenes_so_far = 0
-                else: 
-                     num_scenes_so_far = num_cuts + 1
-
-                # Try passing tuple or dict if callback supports it, 
-                # but standard callback usually takes 1 arg. 
-                # We control the callback in main.py, so we can change signature.
-                callback(progress, fps, eta, num_scenes_so_far)
+        # scenedetect decodes in a background thread and handles downscaling itself
+        scene_manager.detect_scenes(
+            video=video,
+            frame_skip=frame_skip,
+            show_progress=False,
+            callback=reporter.on_cut if reporter else None
+        )
+        if stop_event is not None and stop_event.is_set():
+            raise RuntimeError("Scene detection cancelled")
         
         # Signal 100% done
-        if callback:
-             final_scenes = len(scene_manager._cutting_list) + 1 if len(scene_manager._cutting_list) > 0 else 0
+        if reporter:
+             final_scenes = reporter.num_cuts + 1 if reporter.num_cuts > 0 else 0
              callback(100, 0.0, 0.0, final_scenes)
-             
-        # Post-process (required in some modes, good practice)
-        # Manually construct last position to avoid potential NoneType from video.position at EOF
-        if video.base_timecode:
-             scene_manager._last_pos = video.base_timecode + frame_num
-        else:
-             # Fallback if base_timecode is somehow missing (unlikely with open_video)
-             from scenedetect import FrameTimecode
-             scene_manager._last_pos = FrameTimecode(frame_num, video.frame_rate)
-             
-        scene_manager._post_process(frame_num)
 
         scene_list = scene_manager.get_scene_list()
         
@@ -120,22 +409,270 @@ class VideoProcessor:
         for scene in scene_list:
             start, end = scene
             scenes_seconds.append((start.get_seconds(), end.get_seconds()))
+
+        # scenedetect ends the last scene where the final frame starts; keep that frame
+        if scenes_seconds and video.duration is not None:
+            start, end = scenes_seconds[-1]
+            scenes_seconds[-1] = (start, max(end, video.duration.get_seconds()))
             
         return scenes_seconds
 
+    def detect_scenes_fast(self, video_path: str, threshold: float = 27.0, callback=None, min_scene_len: int = 15, stop_event: threading.Event = None) -> List[Tuple[float, float]]:
+        """
+        Approximate scene detection using ffmpeg's `scene` score (select + showinfo),
+        so the per-frame work runs in libavfilter instead of Python/OpenCV.
+        `threshold` uses the ContentDetector scale and is mapped to ffmpeg's 0-1 score.
+        Returns a list of (start_time, end_time) tuples in seconds.
+        Setting `stop_event` kills ffmpeg and raises RuntimeError, as in detect_scenes.
+        """
+        try:
+             video = open_video(video_path)
+             fps = video.frame_rate
+             duration = video.duration.get_seconds() if video.duration is not None else 0.0
+        except:
+             fps = 30.0 # Fallback 30fps
+             duration = 0.0
+
+        cmd = [
+            self.ffmpeg_path, '-nostats',
+            '-progress', 'pipe:1',
+            '-i', video_path,
+            '-an', '-sn', '-dn',
+            # Scene score on a small frame is plenty for cut detection and much cheaper.
+            # setpts: the video can start after the other streams (e.g. B-frame delay without
+            # an edit list); count from its first frame like detect_scenes does.
+            '-filter:v', f"setpts=PTS-STARTPTS,scale=320:-2,select='gt(scene,{threshold / 100.0})',showinfo",
+            '-f', 'null', '-'
+        ]
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # ffmpeg echoes metadata as-is, which needn't be UTF-8 (or the locale's codec)
+            encoding='utf-8',
+            errors='replace'
+        )
+
+        # showinfo logs one line per selected frame (i.e. per cut) on stderr
+        cuts = []
+        reader_error = []
+        def read_cuts():
+            try:
+                for line in process.stderr:
+                    match = _PTS_TIME_RE.search(line)
+                    if match:
+                        cuts.append(float(match.group(1)))
+            except Exception as e:
+                # Reported below instead of returning partial cuts; stop ffmpeg, which
+                # would otherwise block once nobody drains the pipe
+                reader_error.append(e)
+                process.kill()
+        stderr_thread = threading.Thread(target=read_cuts, daemon=True)
+        stderr_thread.start()
+
+        # -progress writes key=value blocks on stdout, each ending in progress=continue|end
+        start_time = time.monotonic()
+        out_time = 0.0
+        encode_fps = 0.0
+        for line in process.stdout:
+            if stop_event is not None and stop_event.is_set():
+                process.kill()
+                break
+            key, _, value = line.strip().partition('=')
+            if key in ('out_time_us', 'out_time_ms'): # both are microseconds
+                try:
+                    out_time = int(value) / 1_000_000
+                except ValueError:
+                    pass
+            elif key == 'fps':
+                try:
+                    encode_fps = float(value)
+                except ValueError:
+                    pass
+            elif key == 'progress' and callback and duration > 0:
+                elapsed = time.monotonic() - start_time
+                rate = out_time / elapsed if elapsed > 0 else 0
+                eta = (duration - out_time) / rate if rate > 0 else 0
+                progress = min(100, int((out_time / duration) * 100))
+                num_scenes_so_far = len(cuts) + 1 if cuts else 0
+                callback(progress, encode_fps, eta, num_scenes_so_far)
+
+        process.wait()
+        stderr_thread.join()
+        if stop_event is not None and stop_event.is_set():
+            raise RuntimeError("Scene detection cancelled")
+        if reader_error:
+            raise RuntimeError(f"Failed to read FFmpeg scene detection output: {reader_error[0]}")
+        if process.returncode != 0:
+            raise RuntimeError("FFmpeg scene detection failed")
+
+        # Same minimum scene length as ContentDetector (in frames)
+        min_gap = min_scene_len / fps if fps > 0 else 0.5
+        boundaries = [0.0]
+        for cut in sorted(cuts):
+            if cut - boundaries[-1] >= min_gap:
+                boundaries.append(cut)
+        end = max(duration, boundaries[-1])
+
+        if callback:
+             callback(100, 0.0, 0.0, len(boundaries) if len(boundaries) > 1 else 0)
+
+        return [(start, stop) for start, stop in zip(boundaries, boundaries[1:] + [end]) if stop > start]
+
     def split_video(self, video_path: str, scenes: List[Tuple[float, float]], output_dir: str, callback=None):
         """
         Splits the video into segments based on scene timings.
         """
+        created_files, jobs = self._plan_split(video_path, scenes, output_dir)
+        self._run_split_jobs(jobs, len(scenes), callback=callback)
+        return created_files
+
+    def split_video_fast(self, video_path: str, scenes: List[Tuple[float, float]], output_dir: str, callback=None, max_drift_frames: int = 1):
+        """
+        Splits the video with a single stream-copy pass of ffmpeg's segment muxer.
+        Stream copy can only cut on keyframes, so any scene whose segment drifted more than
+        `max_drift_frames` from the requested start/end is re-encoded as in split_video.
+        """
+        if not scenes:
+            return []
+        plan = self._plan_split_fast(video_path, scenes, output_dir, max_drift_frames)
+        if plan is None:
+            return self.split_video(video_path, scenes, output_dir, callback=callback)
+
+        created_files, jobs = plan
+        self._run_split_jobs(jobs, len(scenes), done=len(scenes) - len(jobs), callback=callback)
+        return created_files
+
+    async def split_video_async(self, video_path: str, scenes: List[Tuple[float, float]], output_dir: str, callback=None, fast: bool = False):
+        """
+        Same as split_video (or split_video_fast if `fast`), but awaits the ffmpeg
+        encodes as asyncio subprocesses instead of holding a thread for each one.
+        """
+        plan = None
+        if fast and scenes:
+            # The stream-copy pass is a single ffmpeg run; keep it off the event loop
+            plan = await asyncio.to_thread(self._plan_split_fast, video_path, scenes, output_dir)
+        if plan is None:
+            plan = await asyncio.to_thread(self._plan_split, video_path, scenes, output_dir)
+
+        created_files, jobs = plan
+        await self._run_split_jobs_async(jobs, len(scenes), done=len(scenes) - len(jobs), callback=callback)
+        return created_files
+
+    def _plan_split(self, video_path: str, scenes: List[Tuple[float, float]], output_dir: str):
+        """
+        Returns (output files, ffmpeg commands) to re-encode every scene.
+        """
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        filename = os.path.basename(video_path)
-        name, ext = os.path.splitext(filename)
-        
+        frame_duration = self._get_frame_duration(video_path)
+
         created_files = []
-        total_scenes = len(scenes)
-        
+        jobs = []
+        for i, (start, end) in enumerate(scenes):
+            output_file = self._scene_output_file(video_path, output_dir, i)
+            jobs.append(self._build_split_cmd(video_path, i, start, end, output_file, frame_duration))
+            created_files.append(output_file)
+        return created_files, jobs
+
+    def _plan_split_fast(self, video_path: str, scenes: List[Tuple[float, float]], output_dir: str, max_drift_frames: int = 1):
+        """
+        Runs the stream-copy pass and moves every segment that matches its scene into place.
+        Returns (output files, ffmpeg commands for the scenes still to re-encode),
+        or None if the video can't be stream-copied.
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        frame_duration = self._get_frame_duration(video_path)
+        tolerance = frame_duration * (max_drift_frames + 0.5)
+
+        seg_dir = os.path.join(output_dir, ".segments")
+        if os.path.exists(seg_dir):
+            shutil.rmtree(seg_dir)
+        os.makedirs(seg_dir)
+        seg_list = os.path.join(seg_dir, "segments.csv")
+
+        # Cut at every scene boundary; the segment list records where each cut actually landed.
+        boundaries = sorted({t for scene in scenes for t in scene if t > 0})
+        cmd = [
+            self.ffmpeg_path, '-y',
+            '-i', video_path,
+            '-map', '0:v:0',
+            '-map', '0:a?',
+            '-c', 'copy',
+            '-f', 'segment',
+            '-segment_times', ','.join(f"{t:.3f}" for t in boundaries),
+            '-segment_list', seg_list,
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            '-segment_format_options', 'movflags=+faststart', # Web optimization
+            os.path.join(seg_dir, 'seg_%03d.mp4')
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0 or not os.path.exists(seg_list):
+            # e.g. source codecs that can't be stream-copied into MP4
+            shutil.rmtree(seg_dir, ignore_errors=True)
+            return None
+
+        segments = []
+        with open(seg_list, newline='') as f:
+            for row in csv.reader(f):
+                segments.append((os.path.join(seg_dir, row[0]), float(row[1]), float(row[2])))
+
+        # The listed times are on ffmpeg's stream-copy timeline, which can be shifted from the
+        # scene times (e.g. by the B-frame delay). Scene times count frames from the first one,
+        # so place the segments by their frame counts instead when PyAV can read them.
+        frame_counts = self._count_frames([seg_path for seg_path, _, _ in segments])
+        if frame_counts is not None:
+            position = 0
+            for i, ((seg_path, _, _), count) in enumerate(zip(segments, frame_counts)):
+                segments[i] = (seg_path, position * frame_duration, (position + count) * frame_duration)
+                position += count
+
+        created_files = []
+        jobs = []
+        for i, (start, end) in enumerate(scenes):
+            output_file = self._scene_output_file(video_path, output_dir, i)
+            created_files.append(output_file)
+
+            match = None
+            for j, (seg_path, seg_start, seg_end) in enumerate(segments):
+                # The last segment runs to the end of the file, whatever duration was reported
+                ends_match = abs(seg_end - end) <= tolerance or (j == len(segments) - 1 and end >= seg_end)
+                if abs(seg_start - start) <= tolerance and ends_match:
+                    match = seg_path
+                    break
+
+            if match is not None and os.path.exists(match):
+                os.replace(match, output_file)
+            else:
+                jobs.append(self._build_split_cmd(video_path, i, start, end, output_file, frame_duration))
+
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        print(f"Stream copy matched {len(scenes) - len(jobs)} of {len(scenes)} scenes")
+        return created_files, jobs
+
+    def _count_frames(self, paths: List[str]):
+        """
+        Returns the number of video frames in each file, as stored in the container.
+        None if PyAV isn't available or a count is missing.
+        """
+        if av is None:
+            return None
+        counts = []
+        try:
+            for path in paths:
+                with av.open(path) as container:
+                    counts.append(container.streams.video[0].frames)
+        except (av.error.FFmpegError, IndexError):
+            return None
+        if not all(counts):
+            return None
+        return counts
+
+    def _get_frame_duration(self, video_path: str) -> float:
         # Get frame rate for precise offset calculation
         # We need to open the video to get stats
         try:
@@ -144,49 +681,122 @@ class VideoProcessor:
              frame_duration = 1.0 / fps if fps > 0 else 0.033
         except:
              frame_duration = 0.033 # Fallback 30fps
+        return frame_duration
 
+    def _scene_output_file(self, video_path: str, output_dir: str, index: int) -> str:
+        name, ext = os.path.splitext(os.path.basename(video_path))
         # Force MP4 output for web/immich compatibility
         # H.264 in AVI is problematic, and 'faststart' only works with MP4/MOV.
         ext = ".mp4"
+        return os.path.join(output_dir, f"{name}_scene_{index+1:03d}{ext}")
 
-        for i, (start, end) in enumerate(scenes):
-            output_file = os.path.join(output_dir, f"{name}_scene_{i+1:03d}{ext}")
-            
-            # Switch to re-encoding to fix keyframe issues (black screen) and overlap.
-            # -c:v libx264 -preset fast -crf 23: Good balance of speed and quality.
-            # -c:a copy: Copy audio to avoid quality loss there (unless it causes sync issues, then aac).
-            # -ss before -i: Fast seek. With re-encoding, ffmpeg decodes from previous keyframe but drops frames until -ss, ensuring clean start.
-            
-            # FIX: Add tiny offset to start time (e.g. 0.5 frame) to prevent ffmpeg from 
-            # picking up the last frame of the PREVIOUS scene due to rounding errors,
-            # which ruins thumbnails. 
-            # Only apply to 2nd scene onwards (i > 0)
-            adj_start = start
-            if i > 0:
-                adj_start = start + (frame_duration * 0.5)
-
-            cmd = [
-                'ffmpeg', '-y',
-                '-ss', f"{adj_start:.3f}",
-                '-i', video_path,
-                '-t', str(end - start),
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '22',
-                '-pix_fmt', 'yuv420p', # Ensure wide compatibility (prevent flickering in some web players)
-                '-movflags', '+faststart', # Web optimization
-                '-c:a', 'aac', # Re-encode audio too to ensure timestamp sync
-                output_file
+    def _build_split_cmd(self, video_path: str, index: int, start: float, end: float, output_file: str, frame_duration: float) -> List[str]:
+        # Switch to re-encoding to fix keyframe issues (black screen) and overlap.
+        # -c:v libx264 -preset fast -crf 23: Good balance of speed and quality.
+        # -c:a copy: Copy audio to avoid quality loss there (unless it causes sync issues, then aac).
+        # -ss before -i: Fast seek. With re-encoding, ffmpeg decodes from previous keyframe but drops frames until -ss, ensuring clean start.
+        
+        # FIX: Add tiny offset to start time (e.g. 0.5 frame) to prevent ffmpeg from 
+        # picking up the last frame of the PREVIOUS scene due to rounding errors,
+        # which ruins thumbnails. 
+        # Only apply to 2nd scene onwards (index > 0)
+        adj_start = start
+        if index > 0:
+            adj_start = start + (frame_duration * 0.5)
+
+        return [
+            self.ffmpeg_path, '-y',
+            '-ss', f"{adj_start:.3f}",
+            '-i', video_path,
+            '-t', str(end - start),
+            '-c:v', 'libx264',
+            '-preset', 'fast',
+            '-crf', '22',
+            '-threads', '2', # Several encodes run at once, keep each one small
+            '-pix_fmt', 'yuv420p', # Ensure wide compatibility (prevent flickering in some web players)
+            '-movflags', '+faststart', # Web optimization
+            '-c:a', 'aac', # Re-encode audio too to ensure timestamp sync
+            output_file
+        ]
+
+    def _run_split_jobs(self, jobs: List[List[str]], total_scenes: int, done: int = 0, callback=None):
+        """
+        Runs the ffmpeg encode commands in parallel, reporting progress over `total_scenes`.
+        """
+        if callback and done:
+            callback(int((done / total_scenes) * 100))
+
+        completed = done
+        with ThreadPoolExecutor(max_workers=_SPLIT_WORKERS) as pool:
+            futures = [
+                pool.submit(subprocess.run, cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for cmd in jobs
             ]
-            
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            created_files.append(output_file)
-            
+            for future in as_completed(futures):
+                result = future.result()
+                if result.returncode != 0:
+                    for pending in futures:
+                        pending.cancel()
+                    raise RuntimeError(f"FFmpeg failed to encode {os.path.basename(result.args[-1])}")
+                completed += 1
+                if callback:
+                    progress = int((completed / total_scenes) * 100)
+                    callback(progress)
+
+    async def _run_split_jobs_async(self, jobs: List[List[str]], total_scenes: int, done: int = 0, callback=None):
+        """
+        Async version of _run_split_jobs, with the same number of encodes in flight.
+        """
+        if callback and done:
+            callback(int((done / total_scenes) * 100))
+
+        semaphore = asyncio.Semaphore(_SPLIT_WORKERS)
+        completed = done
+
+        async def encode(cmd):
+            nonlocal completed
+            async with semaphore:
+                returncode, _ = await self._run_ffmpeg_async(cmd)
+            if returncode != 0:
+                raise RuntimeError(f"FFmpeg failed to encode {os.path.basename(cmd[-1])}")
+            completed += 1
             if callback:
-                progress = int(((i + 1) / total_scenes) * 100)
+                progress = int((completed / total_scenes) * 100)
                 callback(progress)
-            
-        return created_files
+
+        tasks = [asyncio.ensure_future(encode(cmd)) for cmd in jobs]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # One encode failed (or we were cancelled): stop the others too, which kills their ffmpeg
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _run_ffmpeg_async(self, cmd: List[str]) -> Tuple[int, bytes]:
+        """
+        Runs ffmpeg without blocking the event loop. Returns (returncode, stdout).
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except NotImplementedError:
+            # Loop without subprocess support (e.g. SelectorEventLoop on Windows)
+            result = await asyncio.to_thread(subprocess.run, cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            return result.returncode, result.stdout
+
+        try:
+            output, _ = await process.communicate()
+        except asyncio.CancelledError:
+            # Client went away; don't leave ffmpeg running
+            if process.returncode is None:
+                process.kill()
+            raise
+        return process.returncode, output
 
     def generate_thumbnail(self, video_path: str, time: float) -> bytes:
         """
@@ -199,18 +809,163 @@ class VideoProcessor:
         # rather than safely on the boundary (which might round down to previous scene).
         # 0.1s is safe for most frame rates (steps ~2-6 frames in).
         adj_time = time + 0.1
+
+        if self._thumb_worker_available:
+            try:
+                return self._grab_thumbnail(video_path, adj_time)
+            except ImportError:
+                self._thumb_worker_available = False
+            except Exception as e:
+                print(f"Thumbnail worker failed, falling back to ffmpeg: {e}")
         
+        process = subprocess.Popen(
+            self._build_thumbnail_cmd(video_path, adj_time),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError("FFmpeg failed to generate thumbnail")
+            
+        return output
+
+    async def generate_thumbnail_async(self, video_path: str, time: float) -> bytes:
+        """
+        Same as generate_thumbnail, without blocking the event loop.
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError("Video file not found")
+
+        adj_time = time + 0.1 # See generate_thumbnail
+
+        if self._thumb_worker_available:
+            try:
+                return await asyncio.to_thread(self._grab_thumbnail, video_path, adj_time)
+            except ImportError:
+                self._thumb_worker_available = False
+            except Exception as e:
+                print(f"Thumbnail worker failed, falling back to ffmpeg: {e}")
+
+        returncode, output = await self._run_ffmpeg_async(self._build_thumbnail_cmd(video_path, adj_time))
+        if returncode != 0:
+            raise RuntimeError("FFmpeg failed to generate thumbnail")
+
+        return output
+
+    def _build_thumbnail_cmd(self, video_path: str, time: float) -> List[str]:
         # ffmpeg -ss {time} -i {path} -vframes 1 -vf scale=200:-1 -f image2 pipe:1
-        cmd = [
-            'ffmpeg',
-            '-ss', str(adj_time),
+        return [
+            self.ffmpeg_path,
+            '-ss', str(time),
             '-i', video_path,
             '-vframes', '1',
             '-vf', 'scale=200:-1', # Width 200, maintain aspect ratio
             '-f', 'image2',
             'pipe:1'
         ]
-        
+
+    def _grab_thumbnail(self, video_path: str, time: float) -> bytes:
+        """
+        Grabs a thumbnail through an idle worker for this video (opening one if there is none),
+        then hands the worker back to the pool.
+        """
+        stat = os.stat(video_path)
+        key = (os.path.abspath(video_path), stat.st_mtime_ns, stat.st_size)
+        with self._thumb_lock:
+            idle = self._thumb_workers.get(key)
+            worker = idle.pop() if idle else None
+        if worker is None:
+            worker = _ThumbnailWorker(video_path)
+
+        try:
+            image = worker.grab(time)
+        except Exception:
+            worker.close()
+            raise
+
+        worker.touch()
+        stale = []
+        with self._thumb_lock:
+            idle = self._thumb_workers.pop(key, [])
+            self._thumb_workers[key] = idle # Re-insert as most recently used
+            if len(idle) < _THUMB_WORKERS_PER_VIDEO:
+                idle.append(worker)
+            else:
+                stale.append(worker)
+            while len(self._thumb_workers) > _THUMB_VIDEOS:
+                stale.extend(self._thumb_workers.pop(next(iter(self._thumb_workers))))
+            if self._thumb_sweep is None:
+                self._thumb_sweep = threading.Timer(_THUMB_IDLE_SECONDS, self._close_idle_thumbnail_workers)
+                self._thumb_sweep.daemon = True
+                self._thumb_sweep.start()
+        for old in stale:
+            old.close()
+        return image
+
+    def _close_idle_thumbnail_workers(self, max_idle: float = None):
+        """
+        Closes the pooled thumbnail workers unused for `max_idle` seconds (default
+        _THUMB_IDLE_SECONDS), and checks again later while some are still open.
+        """
+        if max_idle is None:
+            max_idle = _THUMB_IDLE_SECONDS
+        now = time.monotonic()
+        stale = []
+        with self._thumb_lock:
+            self._thumb_sweep = None
+            for key in list(self._thumb_workers):
+                idle = self._thumb_workers[key]
+                stale.extend(worker for worker in idle if now - worker.last_used >= max_idle)
+                idle[:] = [worker for worker in idle if now - worker.last_used < max_idle]
+                if not idle:
+                    del self._thumb_workers[key]
+            if self._thumb_workers:
+                self._thumb_sweep = threading.Timer(_THUMB_IDLE_SECONDS, self._close_idle_thumbnail_workers)
+                self._thumb_sweep.daemon = True
+                self._thumb_sweep.start()
+        for worker in stale:
+            worker.close()
+
+    def close(self):
+        """
+        Closes the videos kept open for thumbnails.
+        """
+        with self._thumb_lock:
+            if self._thumb_sweep is not None:
+                self._thumb_sweep.cancel()
+        self._close_idle_thumbnail_workers(max_idle=0)
+
+    def generate_thumbnails_batch(self, video_path: str, times: List[float]) -> List[bytes]:
+        """
+        Generates JPEG thumbnails for all the given times in a single ffmpeg pass.
+        Returns the JPEG bytes in the same order as `times`.
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError("Video file not found")
+        if not times:
+            return []
+
+        # Same 0.1s offset as generate_thumbnail
+        targets = [time + 0.1 for time in times]
+        wanted = sorted(set(targets))
+        seek = max(0.0, wanted[0] - 0.5)
+
+        # Seek once to just before the first wanted time; after an input seek the select
+        # filter's `t` counts from there. Picks the first frame at or after each time by
+        # timestamp, so variable frame rate sources get the same frames as generate_thumbnail.
+        select = '+'.join(f"gte(t,{t - seek:.6f})*not(gte(prev_t,{t - seek:.6f}))" for t in wanted)
+        cmd = [
+            self.ffmpeg_path,
+            '-ss', f"{seek:.6f}",
+            '-i', video_path,
+            '-vf', f"select='{select}',scale=200:-1",
+            '-vsync', '0',
+            '-frames:v', str(len(wanted)), # Stop decoding after the last wanted frame
+            '-f', 'image2pipe',
+            '-c:v', 'mjpeg',
+            'pipe:1'
+        ]
+
         process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -218,6 +973,27 @@ class VideoProcessor:
         )
         output, _ = process.communicate()
         if process.returncode != 0:
-            raise RuntimeError("FFmpeg failed to generate thumbnail")
-            
-        return output
+            raise RuntimeError("FFmpeg failed to generate thumbnails")
+
+        images = self._split_jpegs(output)
+        if len(images) != len(wanted):
+            # Ran past the end of the stream or lost a frame; fall back to one seek per time.
+            return [self.generate_thumbnail(video_path, time) for time in times]
+
+        by_time = dict(zip(wanted, images))
+        return [by_time[t] for t in targets]
+
+    @staticmethod
+    def _split_jpegs(data: bytes) -> List[bytes]:
+        """
+        Splits concatenated JPEGs from an image2pipe stream on the EOI/SOI boundary.
+        """
+        if not data:
+            return []
+        parts = data.split(b'\xff\xd9\xff\xd8')
+        if len(parts) == 1:
+            return parts
+        images = [parts[0] + b'\xff\xd9']
+        images.extend(b'\xff\xd8' + part + b'\xff\xd9' for part in parts[1:-1])
+        images.append(b'\xff\xd8' + parts[-1])
+        return images
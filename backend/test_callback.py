@@ -1,36 +1,294 @@
-from scenedetect import detect, ContentDetector, SceneManager, open_video
+from scenedetect import detect, ContentDetector, SceneManager, StatsManager, open_video, FrameTimecode
+from scenedetect.detectors import AdaptiveDetector
+from scenedetect.scene_detector import SceneDetector
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from services.video_processor import LumaContentDetector, FrameSkipBuffer, GpuDownscaler, GPU_RESIZE
+import argparse
+import logging
+import os
 import sys
 
-def test_callback():
-    video_path = "C:/Users/laure/Videos/test.mp4" # Placeholder, user has to edit or I need to find a video.
-    # Actually I don't know a video path. I'll just look for one or ask user. 
-    # Or I can just check the generic imports and try to mock? 
-    # No, let's just make the script require an argument.
-    
-    if len(sys.argv) < 2:
-        print("Usage: python test_callback.py <video_path>")
-        return
-
-    video_path = sys.argv[1]
-    print(f"Testing callback on {video_path}")
-
-    video = open_video(video_path)
-    scene_manager = SceneManager()
-    scene_manager.add_detector(ContentDetector())
+log = logging.getLogger(__name__)
+
+# Don't split videos into pieces shorter than this (seconds)
+MIN_SEGMENT_SECONDS = 10.0
+# Stop early to save time: only frames 0-100 are decoded (None = whole video)
+MAX_FRAMES = 101
+
+class _LumaAdaptiveDetector(AdaptiveDetector, LumaContentDetector):
+    """
+    AdaptiveDetector scoring frames with LumaContentDetector's grayscale diff.
+    Comparing each score to its neighbours' average filters out flashes and camera
+    motion, so one pass is enough instead of re-running with a tuned threshold.
+    Frames whose score is already in the StatsManager (--stats-cache, or scored by
+    _run_gpu) aren't decoded; the stored score is used instead.
+    """
+    def __init__(self):
+        super().__init__(luma_only=True)
+        self._last_img = None
+
+    def is_processing_required(self, frame_num):
+        # ContentDetector always asks for the frame; go back to the base check so frames
+        # whose metrics are already stored aren't decoded at all
+        return SceneDetector.is_processing_required(self, frame_num)
+
+    def _calculate_frame_score(self, frame_num, frame_img):
+        if frame_img is None or frame_img is self._last_img:
+            # SceneManager didn't decode this frame; it passes the last decoded frame again, or None
+            self._last_lum = None # Don't diff the next decoded frame against a stale one
+            score = None
+            if self.stats_manager is not None:
+                score = self.stats_manager.get_metrics(frame_num, [self.FRAME_SCORE_KEY])[0]
+            return score if score is not None else 0.0
+        self._last_img = frame_img
+        return super()._calculate_frame_score(frame_num, frame_img)
+
+def _open_video(video_path, max_threads=16):
+    """
+    Opens the video with PyAV so FFmpeg can decode with several threads
+    (falls back to OpenCV if PyAV isn't installed).
+    """
+    video = open_video(video_path, backend='pyav', threading_mode='AUTO')
+    if hasattr(video, '_video_stream'):
+        # Same scaling as Chromium's decoder: ~3 threads at 1080p, more for larger frames
+        width, height = video.frame_size
+        video._video_stream.thread_count = max(2, min(max_threads, 16, width * height * 3 // (1920 * 1080)))
+    return video
+
+def _close_video(video):
+    """
+    Releases the decoder (and the frames it still buffers) right away instead of
+    whenever the stream object is garbage collected.
+    """
+    container = getattr(video, '_container', None) # PyAV
+    if container is not None:
+        container.close()
+    capture = getattr(video, 'capture', None) # OpenCV
+    if capture is not None:
+        capture.release()
+
+def _downscale(video):
+    # Detect on a ~256px wide copy of each frame; cuts don't need full resolution.
+    # Also takes torchcodec's stream metadata.
+    width = video.width if hasattr(video, 'width') else video.frame_size[0]
+    return max(1, width // 256)
+
+def _stats_path(video_path, downscale):
+    """
+    Where --stats-cache keeps the frame metrics. The scores depend on the detector, the
+    downscale factor and where frames are resized, so those are part of the name.
+    """
+    return f"{video_path}.luma-x{downscale}-{GPU_RESIZE or 'cpu'}.stats.csv"
+
+def _load_stats(stats, path):
+    """
+    Loads a CSV written by StatsManager.save_to_csv (without the deprecated load_from_csv).
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        keys = next(reader)[2:] # Frame Number, Timecode, metrics...
+        stats.register_metrics(keys)
+        for row in reader:
+            # Frame numbers are written 1-based
+            metrics = {key: float(value) for key, value in zip(keys, row[2:]) if value != 'None'}
+            stats.set_metrics(int(row[0]) - 1, metrics)
+
+def _run_segment(video_path, start, end, max_threads=16, stats_out=None):
+    """
+    Runs detection on [start, end) seconds of the video in its own process.
+    Returns the cuts found, in seconds (timecodes are absolute since we seek),
+    and the frame numbers the callback was called with.
+    If `stats_out` is set, the frame metrics are loaded from the video's stats CSV
+    and the updated metrics are written to `stats_out` for the parent to merge.
+    """
+    video = _open_video(video_path, max_threads)
+    downscale = _downscale(video)
+    stats = None
+    if stats_out is not None:
+        stats = StatsManager()
+        if os.path.exists(_stats_path(video_path, downscale)):
+            _load_stats(stats, _stats_path(video_path, downscale))
+    scene_manager = SceneManager(stats_manager=stats)
+    scene_manager.auto_downscale = False
+    # Score on brightness only. ContentDetector(luma_only=True) still converts every
+    # frame to HSV and only ignores hue/saturation; this one diffs grayscale directly.
+    detector = _LumaAdaptiveDetector()
+    if GPU_RESIZE is not None:
+        # Resize (and with OpenCL, the grayscale diff too) on the GPU, like the backend
+        scene_manager.downscale = 1
+        scene_manager.add_detector(GpuDownscaler(detector, GPU_RESIZE, downscale))
+    else:
+        scene_manager.downscale = downscale
+        scene_manager.add_detector(detector)
+
+    # Collected and logged by the parent once detection is done; the workers'
+    # own logging isn't configured (and would interleave across processes)
+    callback_frames = []
+
+    def my_callback(image, frame_num):
+        callback_frames.append(frame_num)
+
+    # Start min_scene_len (+1) frames early: the detector never cuts that close to where it
+    # started, so otherwise a cut right after the boundary would be lost.
+    # Cuts in the overlap belong to the previous segment and are dropped.
+    frame = 1.0 / video.frame_rate
+    if start > 0:
+        video.seek(max(0.0, start - 16 * frame))
+    # Look at every other frame, or ~30 per second of high frame rate footage.
+    # frame_num passed to the callback still counts the skipped frames.
+    frame_skip = 0 if stats is not None else max(1, int(video.frame_rate) // 30 - 1)
+    if frame_skip > 0:
+        scene_manager.add_detector(FrameSkipBuffer(detector, frame_skip)) # Needed for the callback with frame_skip
+    try:
+        scene_manager.detect_scenes(video, show_progress=False, callback=my_callback, end_time=end, frame_skip=frame_skip)
+    finally:
+        _close_video(video)
+    if stats is not None:
+        stats.save_to_csv(stats_out)
+    cuts = [scene_start.get_seconds() for scene_start, _ in scene_manager.get_scene_list()[1:]]
+    return [cut for cut in cuts if start - frame / 2 <= cut < end - frame / 2], callback_frames
+
+def _cuda_decoder_available():
+    """
+    True if torchcodec is installed and a CUDA device is available to decode on.
+    """
+    try:
+        import torch
+        import torchcodec # Optional dependency
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+def _run_gpu(video_path, end, batch_size=16):
+    """
+    Same detection as _run_segment over [0, end) seconds, but frames are decoded on the GPU
+    (NVDEC through torchcodec) and scored there, so only one float per frame reaches the CPU.
+    The scores go through the same _LumaAdaptiveDetector via a StatsManager, so the
+    cut logic is identical to the CPU path.
+    `batch_size` full-size frames are decoded at once (~400 MB of GPU memory at 4K).
+    """
+    import torch
+    from torchcodec.decoders import VideoDecoder
+
+    decoder = VideoDecoder(video_path, device="cuda")
+    fps = decoder.metadata.average_fps
+    num_frames = min(len(decoder), int(round(end * fps)))
+    # Score on the same ~256px wide frames as the CPU path
+    step = _downscale(decoder.metadata)
+    # RGB -> luma with the same weights as cv2.COLOR_BGR2GRAY
+    weights = torch.tensor([0.299, 0.587, 0.114], device="cuda").view(1, 3, 1, 1)
+
+    stats = StatsManager()
+    detector = _LumaAdaptiveDetector()
+    detector.stats_manager = stats
+    cuts = []
+    callback_frames = []
 
     def my_callback(image, frame_num):
-        print(f"Callback called! Frame: {frame_num}")
-        # Stop early to save time
-        if frame_num > 100:
-            return
+        callback_frames.append(frame_num)
+
+    prev = None
+    for batch_start in range(0, num_frames, batch_size):
+        batch_end = min(batch_start + batch_size, num_frames)
+        frames = decoder.get_frames_in_range(batch_start, batch_end).data
+        # Downscale first (every step-th pixel; a strided view, no copy) so only the small
+        # frames are converted to float: the full batch in float32 would take GBs at 4K
+        lum = (frames[:, :, ::step, ::step].float() * weights).sum(dim=1)
+        if prev is None:
+            scores = [0.0] + (lum[1:] - lum[:-1]).abs().mean(dim=(1, 2)).tolist()
+        else:
+            lum_pairs = torch.cat((prev.unsqueeze(0), lum))
+            scores = (lum_pairs[1:] - lum_pairs[:-1]).abs().mean(dim=(1, 2)).tolist()
+        prev = lum[-1]
+
+        for offset, score in enumerate(scores):
+            frame_num = batch_start + offset
+            stats.set_metrics(frame_num, {ContentDetector.FRAME_SCORE_KEY: score, 'delta_lum': score})
+            # No image: the detector reads the score back from the StatsManager
+            for cut in detector.process_frame(frame_num, None):
+                cuts.append(cut / fps)
+                # The detector reports cuts a few frames late; decode the frame again only
+                # if it isn't in this batch
+                image = frames[cut - batch_start] if cut >= batch_start else decoder[cut]
+                # Only cut frames are copied back to the host, as BGR like OpenCV's
+                my_callback(image.permute(1, 2, 0).flip(-1).cpu().numpy(), cut)
+    return cuts, callback_frames
+
+def _merge_segments(results, duration):
+    """
+    Builds the scene list from the cuts of every segment.
+    Segment boundaries aren't cuts themselves, so scenes are only split where a segment found one.
+    """
+    boundaries = [0.0] + sorted(set(cut for cuts in results for cut in cuts if cut > 0))
+    return list(zip(boundaries, boundaries[1:] + [duration]))
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Runs scene detection on a video and reports the frames the per-cut callback got.")
+    parser.add_argument("video_path")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every callback frame")
+    parser.add_argument("--gpu", action="store_true",
+                        help="Decode and score on a CUDA GPU with torchcodec (experimental)")
+    # scenedetect doesn't allow frame_skip together with a StatsManager, so this disables it
+    parser.add_argument("--stats-cache", action="store_true",
+                        help="Keep per-frame metrics in a CSV next to the video so later runs skip decoding frames already scored (no frame skipping)")
+    return parser.parse_args()
+
+def test_callback():
+    args = _parse_args()
+    # Handler on this script's logger only, so scenedetect's own INFO logging stays hidden.
+    # DEBUG stays off unless asked for, so the per-frame log calls are a single level check.
+    log.addHandler(logging.StreamHandler(sys.stdout))
+    log.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    video_path = args.video_path
+    log.info("Testing callback on %s", video_path)
+
+    video = _open_video(video_path)
+    duration = video.duration.get_seconds()
+    if MAX_FRAMES is not None:
+        # Returning from the callback doesn't stop detection; an end time does
+        duration = min(duration, FrameTimecode(MAX_FRAMES, video.frame_rate).get_seconds())
+
+    # Decode separate time ranges in separate processes (OpenCV decode + scoring is CPU bound)
+    num_segments = max(1, min(os.cpu_count() or 1, int(duration // MIN_SEGMENT_SECONDS)))
+    step = duration / num_segments
+    intervals = [(i * step, duration if i == num_segments - 1 else (i + 1) * step) for i in range(num_segments)]
 
     try:
-        print("Starting detection...")
-        # Try expected signature
-        scene_manager.detect_scenes(video, show_progress=False, callback=my_callback)
-        print("Detection finished.")
-    except Exception as e:
-        print(f"Error: {e}")
+        if args.gpu and _cuda_decoder_available():
+            # One GPU does the whole range; no worker processes or stats cache needed
+            log.info("Starting detection on the GPU...")
+            results = [_run_gpu(video_path, duration)]
+        else:
+            if args.gpu:
+                log.warning("torchcodec or a CUDA device isn't available, decoding on the CPU")
+            log.info("Starting detection on %d segment(s)...", num_segments)
+            # Split the cores between the workers' decoders
+            max_threads = max(2, (os.cpu_count() or 1) // num_segments)
+            stats_path = _stats_path(video_path, _downscale(video))
+            stats_outs = [None] * num_segments
+            if args.stats_cache:
+                stats_outs = [f"{stats_path}.{i}" for i in range(num_segments)]
+            with ProcessPoolExecutor(max_workers=num_segments) as pool:
+                results = list(pool.map(_run_segment, [video_path] * num_segments, *zip(*intervals), [max_threads] * num_segments, stats_outs))
+            if args.stats_cache:
+                # Every worker saved the cached metrics plus its own; merge them into one file
+                stats = StatsManager(base_timecode=video.base_timecode)
+                for stats_out in stats_outs:
+                    _load_stats(stats, stats_out)
+                    os.remove(stats_out)
+                stats.save_to_csv(stats_path)
+        for frame_num in sorted(set(frame_num for _, frames in results for frame_num in frames)):
+            # Formatted only if a handler will actually emit it
+            log.debug("Callback called! Frame: %d", frame_num)
+        scenes = _merge_segments([cuts for cuts, _ in results], duration)
+        log.info("Detection finished. %d scenes.", len(scenes))
+    except (RuntimeError, OSError) as e:
+        # Anything else (including KeyboardInterrupt) propagates with its traceback
+        log.error("Error: %s", e)
+    finally:
+        _close_video(video)
 
 if __name__ == "__main__":
     test_callback()